@@ -0,0 +1,263 @@
+"""
+MIT License
+
+Copyright (c) 2024 Jordan Maxwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+
+
+from panda3d import core
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+from array import array
+import json
+
+metadata_notify = directNotify.newCategory('sprite-metadata')
+
+# Parsed sheet metadata keyed by resolved file path
+_sheet_data_cache = {}
+
+class SpriteSheetData(object):
+    """
+    Represents the parsed frame metadata of a sprite sheet exported by
+    Aseprite or TexturePacker in either the JSON hash or JSON array format.
+    Frame rects, trim offsets and durations are stored in compact arrays
+    indexed by frame number
+    """
+
+    __slots__ = ('_file_name', '_frame_names', '_frame_index', '_tags', '_rects',
+        '_trims', '_durations', '_size_x', '_size_y', '_source_x', '_source_y',
+        '_image')
+
+    # Number of values stored per frame in the rect tables
+    RECT_STRIDE = 4
+
+    # Default frame duration in seconds for formats without timing data
+    DEFAULT_DURATION = 1.0 / 12
+
+    def __init__(self, data, file_name=None):
+        self._file_name = file_name
+        self._frame_names = []
+        self._frame_index = {}
+        self._tags = {}
+
+        # Frame rect on the sheet in pixels: x, y, w, h
+        self._rects = array('i')
+
+        # Trimmed rect inside the untrimmed frame in pixels: x, y, w, h
+        self._trims = array('i')
+
+        # Frame durations in seconds
+        self._durations = array('f')
+
+        meta = data.get('meta', {})
+        size = meta.get('size', {})
+        self._size_x = int(size.get('w', 0))
+        self._size_y = int(size.get('h', 0))
+        self._source_x = 0
+        self._source_y = 0
+
+        image = meta.get('image')
+        if image and file_name is not None:
+            self._image = core.Filename(file_name.get_dirname(), image)
+        elif image:
+            self._image = core.Filename(image)
+        else:
+            self._image = None
+
+        self.__parse_frames(data.get('frames', []))
+        self.__parse_tags(meta.get('frameTags', []), data.get('animations', {}))
+
+    @property
+    def file_name(self):
+        return self._file_name
+
+    @property
+    def image(self):
+        return self._image
+
+    @property
+    def size_x(self):
+        return self._size_x
+
+    @property
+    def size_y(self):
+        return self._size_y
+
+    @property
+    def source_x(self):
+        return self._source_x
+
+    @property
+    def source_y(self):
+        return self._source_y
+
+    @property
+    def frame_names(self):
+        return self._frame_names
+
+    @property
+    def frame_count(self):
+        return len(self._frame_names)
+
+    @property
+    def rects(self):
+        return self._rects
+
+    @property
+    def trims(self):
+        return self._trims
+
+    @property
+    def durations(self):
+        return self._durations
+
+    @property
+    def tags(self):
+        return self._tags
+
+    def get_frame_index(self, frame):
+        """
+        Returns the frame index for the given frame name or index
+        """
+
+        if isinstance(frame, str):
+            return self._frame_index[frame]
+
+        return int(frame)
+
+    def get_frame_durations(self, frames):
+        """
+        Returns an array of durations in seconds for the given frame indices
+        """
+
+        return array('f', (self._durations[index] for index in frames))
+
+    def __parse_frames(self, frames):
+        """
+        Parses the frames block of the metadata into the frame tables
+        """
+
+        # The hash format keys frames by name while the array format
+        # stores the name on each entry
+        if isinstance(frames, dict):
+            entries = frames.items()
+        else:
+            entries = [(entry.get('filename', str(index)), entry) for index, entry in enumerate(frames)]
+
+        for name, entry in entries:
+            if entry.get('rotated', False):
+                metadata_notify.warning('Rotated frames are not supported; %s will display unrotated' % name)
+
+            frame = entry['frame']
+            x, y, w, h = int(frame['x']), int(frame['y']), int(frame['w']), int(frame['h'])
+
+            source = entry.get('sourceSize', {'w': w, 'h': h})
+            trim = entry.get('spriteSourceSize', {'x': 0, 'y': 0, 'w': w, 'h': h})
+
+            self._frame_index[name] = len(self._frame_names)
+            self._frame_names.append(name)
+            self._rects.extend((x, y, w, h))
+            self._trims.extend((int(trim['x']), int(trim['y']), int(trim['w']), int(trim['h'])))
+            self._source_x = max(self._source_x, int(source['w']))
+            self._source_y = max(self._source_y, int(source['h']))
+
+            duration = entry.get('duration')
+            if duration is None:
+                self._durations.append(self.DEFAULT_DURATION)
+            else:
+                self._durations.append(duration / 1000.0)
+
+        # Fall back to the frame extents when the sheet size is missing
+        if not self._size_x or not self._size_y:
+            for index in range(0, len(self._rects), self.RECT_STRIDE):
+                x, y, w, h = self._rects[index:index + self.RECT_STRIDE]
+                self._size_x = max(self._size_x, x + w)
+                self._size_y = max(self._size_y, y + h)
+
+    def __parse_tags(self, frame_tags, animations):
+        """
+        Parses Aseprite frame tags and TexturePacker animations into
+        named frame index arrays
+        """
+
+        for tag in frame_tags:
+            frames = list(range(int(tag['from']), int(tag['to']) + 1))
+            direction = tag.get('direction', 'forward')
+
+            if direction == 'reverse':
+                frames.reverse()
+            elif direction == 'pingpong':
+                frames = frames + frames[-2:0:-1]
+            elif direction == 'pingpong_reverse':
+                frames.reverse()
+                frames = frames + frames[-2:0:-1]
+
+            self._tags[tag['name']] = array('I', frames)
+
+        for anim_name in animations:
+            try:
+                frames = [self._frame_index[name] for name in animations[anim_name]]
+            except KeyError as e:
+                metadata_notify.warning('Animation %s references unknown frame %s' % (anim_name, e))
+                continue
+
+            self._tags[anim_name] = array('I', frames)
+
+def load_sheet_data(file_path):
+    """
+    Loads and parses a sprite sheet metadata JSON file from the VFS.
+    Parsed metadata is cached per resolved path and shared between sprites.
+    Returns None if the file could not be loaded
+    """
+
+    file_name = core.Filename(file_path)
+
+    vfs = core.VirtualFileSystem.get_global_ptr()
+    search_path = core.get_model_path().get_value()
+    if not vfs.resolve_filename(file_name, search_path):
+        metadata_notify.warning('Failed to find sprite metadata file: %s' % file_name.c_str())
+        return None
+
+    cache_key = file_name.get_fullpath()
+    if cache_key in _sheet_data_cache:
+        return _sheet_data_cache[cache_key]
+
+    if metadata_notify.getDebug():
+        metadata_notify.debug('Loading sprite metadata: %s' % file_name)
+
+    try:
+        data = json.loads(vfs.read_file(file_name, True).decode('utf-8'))
+        sheet_data = SpriteSheetData(data, file_name)
+    except (ValueError, KeyError, TypeError) as e:
+        metadata_notify.warning('Failed to parse sprite metadata file: %s; %s' % (file_name.c_str(), e))
+        return None
+    _sheet_data_cache[cache_key] = sheet_data
+
+    return sheet_data
+
+def clear_sheet_data_cache():
+    """
+    Clears all cached sprite sheet metadata
+    """
+
+    _sheet_data_cache.clear()
@@ -0,0 +1,120 @@
+"""
+MIT License
+
+Copyright (c) 2024 Jordan Maxwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+
+
+from panda3d import core
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+from collections import OrderedDict
+
+paging_notify = directNotify.newCategory('sprite-paging')
+
+page_cache_size = core.ConfigVariableInt('sprite-page-cache-size', 64 * 1024 * 1024,
+    'Maximum number of bytes of sprite sheet page textures kept resident')
+
+class SpritePageCache(object):
+    """
+    Keeps the textures of paged sprite sheets resident up to a byte budget.
+    Least recently used pages are evicted first. Evicted pages that are
+    still displayed by a sprite stay alive until the sprite moves on
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._pages = OrderedDict()
+        self._size = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return page_cache_size.get_value()
+
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, max_size):
+        self._max_size = max_size
+        self.__evict()
+
+    @property
+    def size(self):
+        return self._size
+
+    def __contains__(self, key):
+        return key in self._pages
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        """
+        Returns the resident page texture for the key and marks it as
+        recently used. Returns None if the page is not resident
+        """
+
+        texture = self._pages.get(key)
+        if texture is not None:
+            self._pages.move_to_end(key)
+
+        return texture
+
+    def store(self, key, texture):
+        """
+        Stores a page texture and evicts older pages if over budget
+        """
+
+        if key in self._pages:
+            self._size -= self._pages[key].get_expected_ram_image_size()
+
+        self._pages[key] = texture
+        self._pages.move_to_end(key)
+        self._size += texture.get_expected_ram_image_size()
+        self.__evict()
+
+    def clear(self):
+        """
+        Releases every resident page
+        """
+
+        self._pages.clear()
+        self._size = 0
+
+    def __evict(self):
+        """
+        Releases least recently used pages until the cache is within budget.
+        The most recently used page is always kept
+        """
+
+        max_size = self.max_size
+        while self._size > max_size and len(self._pages) > 1:
+            key, texture = self._pages.popitem(last=False)
+            self._size -= texture.get_expected_ram_image_size()
+
+            if paging_notify.getDebug():
+                paging_notify.debug('Evicted sprite sheet page: %s' % str(key))
+
+# Page cache shared by every paged sprite
+page_cache = SpritePageCache()
@@ -0,0 +1,222 @@
+"""
+MIT License
+
+Copyright (c) 2024 Jordan Maxwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+
+
+from panda3d import core
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+palette_notify = directNotify.newCategory('sprite-palette')
+
+# Number of layer textures the variant shader can stack over the base
+SHADER_MAX_LAYERS = 3
+
+_VERTEX_SHADER = """
+#version 120
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform mat4 p3d_TextureMatrix[1];
+
+attribute vec4 p3d_Vertex;
+attribute vec2 p3d_MultiTexCoord0;
+
+varying vec2 texcoord;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+    texcoord = (p3d_TextureMatrix[0] * vec4(p3d_MultiTexCoord0, 0, 1)).xy;
+}
+"""
+
+_FRAGMENT_HEADER = """
+#version 120
+
+uniform sampler2D p3d_Texture0;
+uniform sampler2D p3d_Texture1;
+uniform sampler2D p3d_Texture2;
+uniform sampler2D p3d_Texture3;
+uniform vec4 p3d_ColorScale;
+uniform int sprite_layer_count;
+
+varying vec2 texcoord;
+
+vec4 blend_over(vec4 dest, vec4 src) {
+    return vec4(mix(dest.rgb, src.rgb, src.a), src.a + dest.a * (1.0 - src.a));
+}
+"""
+
+_VARIANT_FRAGMENT_SHADER = _FRAGMENT_HEADER + """
+uniform sampler2D sprite_palette;
+uniform int sprite_use_palette;
+uniform sampler2D sprite_mask;
+uniform vec4 sprite_tint;
+
+vec4 lookup(vec4 texel) {
+    if (sprite_use_palette == 0) return texel;
+
+    // The red channel stores the palette index of the pixel
+    vec4 color = texture2D(sprite_palette, vec2(texel.r * (255.0 / 256.0) + (0.5 / 256.0), 0.5));
+    return vec4(color.rgb, color.a * texel.a);
+}
+
+void main() {
+    vec4 color = lookup(texture2D(p3d_Texture0, texcoord));
+    if (sprite_layer_count > 0) color = blend_over(color, lookup(texture2D(p3d_Texture1, texcoord)));
+    if (sprite_layer_count > 1) color = blend_over(color, lookup(texture2D(p3d_Texture2, texcoord)));
+    if (sprite_layer_count > 2) color = blend_over(color, lookup(texture2D(p3d_Texture3, texcoord)));
+
+    // The red channel of the mask controls how strongly each pixel is tinted
+    float mask = texture2D(sprite_mask, texcoord).r * sprite_tint.a;
+    color.rgb = mix(color.rgb, color.rgb * sprite_tint.rgb, mask);
+    gl_FragColor = color * p3d_ColorScale;
+}
+"""
+
+# Compiled variant shader shared by every sprite
+_variant_shader = None
+
+# Mask used when a tint should apply to the whole sprite
+_full_mask = None
+
+def get_variant_shader():
+    """
+    Returns the shared shader that colors sprite sheets through an
+    optional palette lookup and an optional masked tint
+    """
+
+    global _variant_shader
+    if _variant_shader is None:
+        _variant_shader = core.Shader.make(
+            core.Shader.SL_GLSL, _VERTEX_SHADER, _VARIANT_FRAGMENT_SHADER)
+
+    return _variant_shader
+
+def get_full_mask():
+    """
+    Returns a single white pixel mask that tints every pixel
+    """
+
+    global _full_mask
+    if _full_mask is None:
+        image = core.PNMImage(1, 1, 1)
+        image.fill(1)
+
+        _full_mask = core.Texture('sprite-full-mask')
+        _full_mask.load(image)
+
+    return _full_mask
+
+class SpritePalette(object):
+    """
+    Represents a color palette for indexed sprite sheets. Indexed sheets
+    store the palette index of each pixel in their red channel and the
+    palette is stored as a small lookup texture, so swapping palettes
+    never touches the sheet texture
+    """
+
+    __slots__ = ('_image', '_texture')
+
+    # Number of colors in a palette; one per 8 bit index value
+    SIZE = 256
+
+    def __init__(self, colors=(), name='sprite-palette'):
+        self._image = core.PNMImage(self.SIZE, 1, 4)
+        self._image.alpha_fill(0)
+
+        self._texture = core.Texture(name)
+        self._texture.set_magfilter(core.Texture.FTNearest)
+        self._texture.set_minfilter(core.Texture.FTNearest)
+        self._texture.set_wrap_u(core.Texture.WMClamp)
+        self._texture.set_wrap_v(core.Texture.WMClamp)
+
+        for index, color in enumerate(colors):
+            self.__store_color(index, color)
+
+        self._texture.load(self._image)
+
+    @property
+    def texture(self):
+        return self._texture
+
+    def get_color(self, index):
+        """
+        Returns the color stored at the given palette index
+        """
+
+        return self._image.get_xel_a(index, 0)
+
+    def set_color(self, index, color):
+        """
+        Sets the color stored at the given palette index
+        """
+
+        self.__store_color(index, color)
+        self._texture.load(self._image)
+
+    def set_colors(self, colors, start=0):
+        """
+        Sets a run of colors starting at the given palette index
+        """
+
+        for index, color in enumerate(colors):
+            self.__store_color(start + index, color)
+
+        self._texture.load(self._image)
+
+    def __store_color(self, index, color):
+        """
+        Stores a color in the palette image without uploading it
+        """
+
+        assert 0 <= index < self.SIZE
+
+        if len(color) == 3:
+            color = (color[0], color[1], color[2], 1.0)
+
+        self._image.set_xel_a(index, 0, *color)
+
+def load_palette(file_path, name=None):
+    """
+    Loads a palette from the first row of an image file. Each pixel of
+    the row becomes the color of the matching palette index
+    """
+
+    file_name = core.Filename(file_path)
+
+    vfs = core.VirtualFileSystem.get_global_ptr()
+    search_path = core.get_model_path().get_value()
+    if not vfs.resolve_filename(file_name, search_path):
+        palette_notify.error('Failed to load palette file: %s' % file_name.c_str())
+        return None
+
+    image = core.PNMImage()
+    if not image.read(file_name):
+        palette_notify.error('Failed to read palette file: %s' % file_name.c_str())
+        return None
+
+    count = min(image.get_x_size(), SpritePalette.SIZE)
+    colors = [image.get_xel_a(index, 0) for index in range(count)]
+
+    return SpritePalette(colors, name or file_name.get_basename_wo_extension())
@@ -0,0 +1,248 @@
+"""
+MIT License
+
+Copyright (c) 2024 Jordan Maxwell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+
+
+from panda3d import core
+
+from direct.directnotify.DirectNotifyGlobal import directNotify
+
+from array import array
+
+sorting_notify = directNotify.newCategory('sprite-sorting')
+
+class SpriteSortBin(object):
+    """
+    Draws sprites in a fixed cull bin ordered by their position on a
+    single axis instead of letting Panda3D sort them back to front by
+    camera distance every frame. Sprites are kept in a nearly sorted list
+    and only re-sorted with an insertion sort when their positions change.
+    Positions are measured relative to the reference node, which defaults
+    to render. Without a reference every sprite must share one parent
+    """
+
+    AXIS_X = 0
+    AXIS_Y = 1
+    AXIS_Z = 2
+
+    # Draw order of the bin relative to the default bins. The default
+    # opaque bin is drawn at 20 and the transparent bin at 30
+    BIN_SORT = 25
+
+    def __init__(self, bin_name='sprite-sort', reference=None, axis=AXIS_Z, bin_sort=BIN_SORT):
+        if reference is None:
+            try:
+                reference = render
+            except NameError:
+                reference = None
+
+        self._bin_name = bin_name
+        self._reference = reference
+        self._axis = axis
+        self._sprites = []
+        self._keys = array('d')
+        self._draw_order = {}
+        self._update_task = None
+
+        # Sprite cards are built in the XZ plane, so the vertical
+        # screen axis of a 2D scene is Panda3D's Z axis by default
+        bin_manager = core.CullBinManager.get_global_ptr()
+        if bin_manager.find_bin(bin_name) == -1:
+            bin_manager.add_bin(bin_name, core.CullBinManager.BT_fixed, bin_sort)
+
+    @property
+    def bin_name(self):
+        return self._bin_name
+
+    @property
+    def reference(self):
+        return self._reference
+
+    @property
+    def axis(self):
+        return self._axis
+
+    @property
+    def sprites(self):
+        return self._sprites
+
+    def add_sprite(self, sprite):
+        """
+        Adds a sprite to the sort bin
+        """
+
+        if sprite in self._draw_order:
+            sorting_notify.warning('Failed to add sprite; %s is already sorted' % sprite.node.get_name())
+            return
+
+        self._sprites.append(sprite)
+        self._keys.append(self.__get_sort_key(sprite))
+        self._draw_order[sprite] = -1
+        self.__sort(len(self._sprites) - 1)
+
+    def remove_sprite(self, sprite):
+        """
+        Removes a sprite from the sort bin and restores its default bin
+        """
+
+        if sprite not in self._draw_order:
+            sorting_notify.warning('Failed to remove sprite; %s is not sorted' % sprite.node.get_name())
+            return
+
+        index = self._sprites.index(sprite)
+        del self._sprites[index]
+        del self._keys[index]
+        del self._draw_order[sprite]
+
+        # Sprites that were cleared no longer have a node to restore
+        if not sprite.node.is_empty():
+            sprite.node.clear_bin()
+
+        self.__assign_draw_order(index)
+
+    def update(self):
+        """
+        Refreshes the sort keys of every sprite and incrementally re-sorts
+        the sprites that moved since the last update. Sprites whose node
+        has been removed are dropped from the bin
+        """
+
+        first_moved = None
+        removed = []
+        keys = self._keys
+        for index, sprite in enumerate(self._sprites):
+            if sprite.node.is_empty():
+                removed.append(index)
+                continue
+
+            key = self.__get_sort_key(sprite)
+            if key != keys[index]:
+                keys[index] = key
+                if first_moved is None:
+                    first_moved = index
+
+        for index in reversed(removed):
+            del self._draw_order[self._sprites[index]]
+            del self._sprites[index]
+            del self._keys[index]
+
+            # Later sprites shift down and need new draw indices
+            if first_moved is None or index < first_moved:
+                first_moved = index
+
+        if first_moved is not None:
+            self.__sort(first_moved)
+
+    def start(self, priority=0):
+        """
+        Starts a task that updates the sort order every frame
+        """
+
+        if self._update_task:
+            taskMgr.remove(self._update_task)
+
+        self._update_task = taskMgr.add(
+            self.__update_task,
+            '%s-%s-update' % (self.__class__.__name__, self._bin_name),
+            sort=priority)
+
+    def stop(self):
+        """
+        Stops the per frame update task
+        """
+
+        if self._update_task:
+            taskMgr.remove(self._update_task)
+            self._update_task = None
+
+    def clear(self):
+        """
+        Removes every sprite from the sort bin
+        """
+
+        self.stop()
+        for sprite in self._sprites:
+            if not sprite.node.is_empty():
+                sprite.node.clear_bin()
+
+        self._sprites = []
+        self._keys = array('d')
+        self._draw_order = {}
+
+    def __get_sort_key(self, sprite):
+        """
+        Returns the position of the sprite on the sort axis
+        """
+
+        if self._reference is not None:
+            return sprite.node.get_pos(self._reference)[self._axis]
+
+        return sprite.node.get_pos()[self._axis]
+
+    def __sort(self, start):
+        """
+        Insertion sorts the sprites from the start index onward. Sprites
+        furthest along the sort axis are drawn first. Nearly sorted lists
+        only need a handful of swaps per moved sprite
+        """
+
+        sprites = self._sprites
+        keys = self._keys
+
+        first_changed = start
+        for index in range(max(start, 1), len(sprites)):
+            key = keys[index]
+            sprite = sprites[index]
+
+            position = index
+            while position > 0 and keys[position - 1] < key:
+                keys[position] = keys[position - 1]
+                sprites[position] = sprites[position - 1]
+                position -= 1
+
+            keys[position] = key
+            sprites[position] = sprite
+            first_changed = min(first_changed, position)
+
+        self.__assign_draw_order(first_changed)
+
+    def __assign_draw_order(self, start):
+        """
+        Applies the sorted list order to the fixed bin draw order of
+        every sprite whose position in the list changed
+        """
+
+        for index in range(start, len(self._sprites)):
+            sprite = self._sprites[index]
+            if self._draw_order[sprite] != index:
+                self._draw_order[sprite] = index
+                sprite.node.set_bin(self._bin_name, index)
+
+    async def __update_task(self, task):
+        """
+        Task used to keep the sprite sort order up to date
+        """
+
+        self.update()
+        return task.cont
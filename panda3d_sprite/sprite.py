@@ -28,15 +28,39 @@ from panda3d import core
 
 from direct.directnotify.DirectNotifyGlobal import directNotify
 
+from panda3d_sprite.metadata import SpriteSheetData, load_sheet_data
+from panda3d_sprite.palette import SHADER_MAX_LAYERS, get_variant_shader, get_full_mask
+from panda3d_sprite.paging import page_cache
+
+from array import array
 import math
 
 sprite_notify = directNotify.newCategory('sprite')
 
+# Resolved sprite sheet file paths keyed by path and search path
+_resolved_paths = {}
+
+# Cell tables shared between sprites, keyed by sheet geometry
+_cell_tables = {}
+
+# Padded sheet textures shared between sprites using stacked layers or
+# tint masks. Each entry holds: texture, size x, size y, sprite references
+_sheet_textures = {}
+
+# Texture stages used to stack layers, indexed by layer position
+_layer_stages = []
+
+# Metadata frame tables shared between sprites, keyed by sheet metadata
+# and the padded texture and cell sizes they were computed against
+_frame_tables = {}
+
 class SpriteCell(object):
     """
     Represents a cell in a sprite sheet
     """
 
+    __slots__ = ('_col', '_row')
+
     def __init__(self, col, row):
         self._col = col
         self._row = row
@@ -49,14 +73,144 @@ class SpriteCell(object):
     def row(self):
         return self._row
 
+class SpriteCellTable(object):
+    """
+    Represents the cells of a sprite sheet grid as a read only sequence.
+    Cell columns and rows are stored in arrays shared by every sprite
+    using the same sheet geometry
+    """
+
+    __slots__ = ('_cols', '_rows')
+
+    def __init__(self, rows, cols):
+        self._cols = array('I', (col_idx for row_idx in range(rows) for col_idx in range(cols)))
+        self._rows = array('I', (row_idx for row_idx in range(rows) for col_idx in range(cols)))
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def __len__(self):
+        return len(self._cols)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[cell_idx] for cell_idx in range(*index.indices(len(self)))]
+
+        return SpriteCell(self._cols[index], self._rows[index])
+
+    def __iter__(self):
+        for cell_idx in range(len(self)):
+            yield SpriteCell(self._cols[cell_idx], self._rows[cell_idx])
+
+def get_cell_table(rows, cols):
+    """
+    Returns the shared cell table for the given sheet geometry
+    """
+
+    key = (rows, cols)
+    table = _cell_tables.get(key)
+    if table is None:
+        table = SpriteCellTable(rows, cols)
+        _cell_tables[key] = table
+
+    return table
+
+def get_layer_stage(index):
+    """
+    Returns the shared texture stage used to stack the layer at the
+    given position. Layers are blended over the previous stages using
+    their alpha, matching the CPU composite of PNMImage.blend_sub_image
+    """
+
+    while len(_layer_stages) <= index:
+        stage = core.TextureStage('sprite-layer-%d' % len(_layer_stages))
+        stage.set_sort(len(_layer_stages) + 1)
+        stage.set_color((1, 1, 1, 1))
+        stage.set_combine_rgb(core.TextureStage.CMInterpolate,
+            core.TextureStage.CSTexture, core.TextureStage.COSrcColor,
+            core.TextureStage.CSPrevious, core.TextureStage.COSrcColor,
+            core.TextureStage.CSTexture, core.TextureStage.COSrcAlpha)
+        stage.set_combine_alpha(core.TextureStage.CMInterpolate,
+            core.TextureStage.CSConstant, core.TextureStage.COSrcAlpha,
+            core.TextureStage.CSPrevious, core.TextureStage.COSrcAlpha,
+            core.TextureStage.CSTexture, core.TextureStage.COSrcAlpha)
+        _layer_stages.append(stage)
+
+    return _layer_stages[index]
+
+def get_frame_table(sheet_data, real_size_x, real_size_y, col_size, row_size):
+    """
+    Returns the shared frame table of the sheet metadata for the given
+    padded texture size and untrimmed cell size. Each frame stores:
+    u, v, su, sv, card x, card z, card sx, card sz
+    """
+
+    key = (sheet_data, real_size_x, real_size_y, col_size, row_size)
+    table = _frame_tables.get(key)
+    if table is not None:
+        return table
+
+    rects = sheet_data.rects
+    trims = sheet_data.trims
+    stride = SpriteSheetData.RECT_STRIDE
+
+    # Frame rects are mapped from pixels on the image rather than the
+    # metadata sheet size, which may be missing or exclude padding
+    table = array('f')
+    for index in range(0, len(rects), stride):
+        x, y, w, h = rects[index:index + stride]
+        trim_x, trim_y, trim_w, trim_h = trims[index:index + stride]
+
+        # Place the trimmed rect inside the untrimmed card, measured
+        # from the bottom left corner of the card
+        card_sx = trim_w / col_size
+        card_sz = trim_h / row_size
+        card_x = trim_x / col_size
+        card_z = 1.0 - (trim_y + trim_h) / row_size
+
+        table.extend((
+            x / real_size_x, 1.0 - (y + h) / real_size_y,
+            w / real_size_x, h / real_size_y,
+            card_x, card_z, card_sx, card_sz))
+
+    _frame_tables[key] = table
+    return table
+
+def clear_resolved_path_cache():
+    """
+    Clears all cached sprite sheet path resolutions. Call this after
+    mounting or unmounting files in the VFS
+    """
+
+    _resolved_paths.clear()
+
+def clear_sheet_texture_cache():
+    """
+    Clears all cached sprite sheet textures used by stacked layers. Sprites
+    keep the textures they already use, but new sprites load their own copy
+    """
+
+    _sheet_textures.clear()
+
 class SpriteAnimation(object):
     """
-    Represents a sprite animation
+    Represents a sprite animation. Cells are compiled to a typed array
+    of non negative frame indices, so the cells property returns an
+    array rather than the sequence passed in
     """
 
-    def __init__(self, cells, fps):
-        self._cells = cells
+    __slots__ = ('_cells', '_fps', '_durations', '_pages', 'playhead')
+
+    def __init__(self, cells, fps, durations=None, pages=None):
+        self._cells = array('I', cells)
         self._fps = fps
+        self._durations = durations
+        self._pages = pages
         self.playhead = 0
 
     @property
@@ -67,6 +221,14 @@ class SpriteAnimation(object):
     def fps(self):
         return self._fps
 
+    @property
+    def durations(self):
+        return self._durations
+
+    @property
+    def pages(self):
+        return self._pages
+
 class Sprite2D(object):
     """
     Represents a 2d sprite node in the scene graph. Handles cells
@@ -82,13 +244,24 @@ class Sprite2D(object):
     TRANS_ALPHA = core.TransparencyAttrib.MAlpha
     TRANS_DUAL = core.TransparencyAttrib.MDual
 
+    LAYERS_COMPOSITE = "Composite"
+    LAYERS_STACKED = "Stacked"
+
+    # Texture stages assumed to be available when no window is open
+    # to query the graphics state guardian
+    MAX_TEXTURE_STAGES = 4
+
     # One pixel is divided by this much. If you load a 100x50 image with PIXEL_SCALE of 10.0
     # you get a card that is 1 unit wide, 0.5 units high
     PIXEL_SCALE = 5.0
 
+    # Number of values stored per frame in the metadata frame table
+    FRAME_TABLE_STRIDE = 8
+
     def __init__(self, file_path, name=None, layers={}, \
                   rows=1, cols=1, scale=1.0, two_sided=True, alpha=TRANS_ALPHA, \
-                  repeat_x=1, repeat_y=1, anchor_x=ALIGN_LEFT, anchor_y=ALIGN_BOTTOM):
+                  repeat_x=1, repeat_y=1, anchor_x=ALIGN_LEFT, anchor_y=ALIGN_BOTTOM, \
+                  sheet_data=None, layer_mode=LAYERS_COMPOSITE, page_rows=0):
 
         scale *= self.PIXEL_SCALE
 
@@ -106,6 +279,50 @@ class Sprite2D(object):
         self._frame_interrupt = True
         self._play_task = None
 
+        # Stacked layers keep each sheet as its own shared texture and
+        # blend them at draw time through texture stages
+        self._layer_mode = layer_mode
+        self._texture_stages = [core.TextureStage.get_default()]
+        self._texture = None
+
+        # Shared sheet texture cache keys held by this sprite, keyed by role
+        self._sheet_texture_refs = {}
+
+        # Paged sheets split the grid into pages of rows that are only
+        # decoded and uploaded when one of their frames is needed
+        self._page_rows = page_rows
+        self._current_page = None
+        self._page_task = None
+
+        # Pages prefetched for the playing animation, keyed by page. They
+        # are held until playback stops so the page cache cannot evict them
+        self._pinned_pages = {}
+
+        # Palette and tint variants are drawn through a shared shader
+        self._variant_shader = None
+        self._palette = None
+        self._tint = None
+        self._tint_mask = None
+
+        # Load the optional sheet metadata. When present the sheet image
+        # defaults to the one referenced by the metadata
+        if sheet_data is not None and not isinstance(sheet_data, SpriteSheetData):
+            sheet_path = sheet_data
+            sheet_data = load_sheet_data(sheet_path)
+            if sheet_data is None:
+                sprite_notify.error('Failed to load sprite metadata: %s' % sheet_path)
+
+        self._sheet_data = sheet_data
+        self._frame_table = None
+
+        assert not (self._page_rows and self._sheet_data is not None)
+
+        if file_path is None:
+            if self._sheet_data is None or self._sheet_data.image is None:
+                sprite_notify.error('Failed to create sprite; No file path or metadata image given')
+
+            file_path = self._sheet_data.image
+
         # Resolve file path
         base_img_file = self.__resolve_vfs_relative_path(
             file_path=file_path, 
@@ -123,7 +340,7 @@ class Sprite2D(object):
         self._img_file = None
         self._size_x = 0
         self._size_y = 0
-        self._frames = []
+        self._frames = None
         self._real_size_x = 0
         self._real_size_y = 0
         self._padded_img = None
@@ -142,6 +359,11 @@ class Sprite2D(object):
         self.__update_final_image()
         self.__construct_sprite_texture()
 
+        # Register the animations defined by the sheet metadata
+        if self._sheet_data is not None:
+            for tag_name in self._sheet_data.tags:
+                self.create_animation(tag_name, self._sheet_data.tags[tag_name], fps=None)
+
     @property
     def animations(self):
         return self._animations
@@ -204,6 +426,12 @@ class Sprite2D(object):
 
     @property
     def frames(self):
+        """
+        The grid cell table of the sheet. Sprites with sheet metadata are
+        laid out as a single cell, so their frames are described by the
+        sheet metadata and frame table instead
+        """
+
         return self._frames
 
     @property
@@ -286,19 +514,52 @@ class Sprite2D(object):
     def layer(self):
         return self._layers
 
+    @property
+    def sheet_data(self):
+        return self._sheet_data
+
+    @property
+    def layer_mode(self):
+        return self._layer_mode
+
+    @property
+    def palette(self):
+        return self._palette
+
+    @property
+    def tint(self):
+        return self._tint
+
+    @property
+    def page_rows(self):
+        return self._page_rows
+
+    @property
+    def current_page(self):
+        return self._current_page
+
+    @property
+    def frame_table(self):
+        return self._frame_table
+
     def __resolve_vfs_relative_path(self, file_path, okMissing=False, file_type=''):
         """
         Resolves a file path to a VFS relative Filename object
-        for use in resource loading
+        for use in resource loading. Successful resolutions are cached
+        per path and model path to avoid repeated search path lookups
         """
 
-        if not isinstance(file_path, core.Filename):
-            file_name = core.Filename(file_path)
-        else:
-            file_name = file_path
+        search_path = core.get_model_path().get_value()
+
+        cache_key = (str(file_path), str(search_path))
+        cached = _resolved_paths.get(cache_key)
+        if cached is not None:
+            return core.Filename(cached)
+
+        # Copy so the resolved result never mutates the callers Filename
+        file_name = core.Filename(file_path)
 
         vfs = core.VirtualFileSystem.get_global_ptr()
-        search_path = core.get_model_path().get_value()
 
         # Verify the file exists
         found = vfs.resolve_filename(file_name, search_path)
@@ -314,8 +575,71 @@ class Sprite2D(object):
 
             return None
 
+        _resolved_paths[cache_key] = core.Filename(file_name)
         return file_name
 
+    def __read_sheet_image(self, img_file, sheet_type, decode=True):
+        """
+        Reads a sprite sheet image through a single VFS stream. The header
+        is validated against the current base sheet dimensions before any
+        pixel data is decoded. Returns None if the image could not be used,
+        or only the header when decode is False
+        """
+
+        assert not img_file.empty()
+
+        if sprite_notify.getDebug():
+            sprite_notify.debug('Loading spritesheet %s: %s' % (sheet_type, img_file))
+
+        vfs = core.VirtualFileSystem.get_global_ptr()
+        stream = vfs.open_read_file(img_file, True)
+        if not stream:
+            sprite_notify.warning('Failed to open spritesheet %s: %s' % (sheet_type, img_file))
+            return None
+
+        try:
+            img_header = core.PNMImageHeader()
+            if not img_header.read_header(stream, img_file.get_fullpath()):
+                sprite_notify.warning('Failed to read spritesheet header: %s' % img_file)
+                return None
+
+            size_x = img_header.get_x_size()
+            size_y = img_header.get_y_size()
+
+            if size_x == 0 or size_y == 0:
+                sprite_notify.warning('Spritesheet %s has no pixels: %s' % (sheet_type, img_file))
+                return None
+
+            if (self._size_x != 0 and self._size_x != size_x) or \
+                (self._size_y != 0 and self._size_y != size_y):
+                sprite_notify.warning('Spritesheet %s size mismatch: %s; expected %dx%d got %dx%d' % (
+                    sheet_type, img_file, self._size_x, self._size_y, size_x, size_y))
+                return None
+
+            if not decode:
+                return img_header
+
+            # Rewind the stream and decode the pixels. Streams that can not
+            # seek, such as some compressed subfiles, are opened again
+            stream.clear()
+            stream.seekg(0)
+            if stream.fail():
+                vfs.close_read_file(stream)
+                stream = vfs.open_read_file(img_file, True)
+                if not stream:
+                    sprite_notify.warning('Failed to reopen spritesheet %s: %s' % (sheet_type, img_file))
+                    return None
+
+            image = core.PNMImage()
+            if not image.read(stream, img_file.get_fullpath()) or not image.is_valid():
+                sprite_notify.warning('Failed to decode spritesheet %s: %s' % (sheet_type, img_file))
+                return None
+        finally:
+            if stream:
+                vfs.close_read_file(stream)
+
+        return image
+
     def swap_base_spritesheet(self, sheet_path):
         """
         Swaps the base sprite sheet
@@ -324,21 +648,47 @@ class Sprite2D(object):
         file_name = self.__resolve_vfs_relative_path(
             file_path=sheet_path,
             file_type='spritesheet')
-        
+
+        # Pages of the previous sheet must not outlive the swap
+        if self._page_rows:
+            self.__cancel_deferred_page()
+            self.__unpin_pages()
+
         self.__load_base_sheet(file_name)
         self.__update_final_image()
         self.__construct_sprite_texture()
 
+        # Pin the pages of a playing animation against the new sheet
+        if self._page_rows and self.__is_animation_playing():
+            self.__pin_animation_pages()
+
     def add_layer(self, layer_name, sheet_path):
         """
         Adds a sprite sheet layer to the sprite object
         """
 
+        if self._page_rows:
+            sprite_notify.warning('Failed to add layer: %s; Not supported by paged sheets' % layer_name)
+            return
+
         file_name = self.__resolve_vfs_relative_path(
             file_path=sheet_path,
             file_type='spritesheet')
 
-        self.__load_layer_sheet(layer_name, file_name)
+        # Fall back to compositing on the CPU once the layers no longer
+        # fit in the available texture stages
+        max_stages = self.__get_max_texture_stages()
+        if self._variant_shader is not None:
+            max_stages = min(max_stages, SHADER_MAX_LAYERS + 1)
+
+        if self._layer_mode == self.LAYERS_STACKED and layer_name not in self._layers and \
+            len(self._layers) + 2 > max_stages:
+            sprite_notify.info('Too many layers to stack; falling back to compositing')
+            self.__fallback_to_composite()
+
+        if not self.__load_layer_sheet(layer_name, file_name):
+            return
+
         self.__update_final_image()
         self.__construct_sprite_texture()
 
@@ -352,38 +702,27 @@ class Sprite2D(object):
             return
 
         del self._layers[layer_name]
+        self.__release_sheet_texture(('layer', layer_name))
         self.__update_final_image()
         self.__construct_sprite_texture()
 
     def __load_layer_sheet(self, layer_name, img_file):
         """
         Loads a layer sheet image file and assigns it to the 
-        layers dictionary using its layer name
+        layers dictionary using its layer name. Returns True if successful
         """
 
-        assert not img_file.empty()
-
-        # Load the spritesheet
-        img_header = core.PNMImageHeader()
-        assert img_header.read_header(img_file)
-
-        if sprite_notify.getDebug():
-            sprite_notify.debug('Loading spritesheet layer: %s' % img_file)
-        
-        image = core.PNMImage()
-        image.read(img_file)
-        assert image.is_valid()
-
-        size_x = image.get_x_size()
-        size_y = image.get_y_size()
-
-        assert size_x != 0
-        assert size_y != 0
+        if self._layer_mode == self.LAYERS_STACKED:
+            image = self.__acquire_sheet_texture(('layer', layer_name), img_file, 'layer')
+        else:
+            image = self.__read_sheet_image(img_file, 'layer')
 
-        assert self._size_x == size_x
-        assert self._size_y == size_y
+        if image is None:
+            sprite_notify.warning('Failed to add layer: %s' % layer_name)
+            return False
 
         self._layers[layer_name] = image
+        return True
 
     def __load_base_sheet(self, img_file):
         """
@@ -391,62 +730,62 @@ class Sprite2D(object):
         the required math for display
         """
 
-        # Load the spritesheet
-        img_header = core.PNMImageHeader()
-        assert img_header.read_header(img_file)
-
-        if sprite_notify.getDebug():
-            sprite_notify.debug('Loading spritesheet base: %s' % img_file)
-        
-        image = core.PNMImage()
-        image.read(img_file)
-        assert image.is_valid()
-
-        size_x = image.get_x_size()
-        size_y = image.get_y_size()
+        # Stacked sprites only need the header when the sheet texture
+        # has already been uploaded by another sprite
+        decode = True
+        if self._layer_mode == self.LAYERS_STACKED:
+            decode = self.__get_sheet_texture_key(img_file) not in _sheet_textures
 
-        assert size_x != 0
-        assert size_y != 0
+        # Paged sheets decode their pixels page by page on demand
+        if self._page_rows:
+            decode = False
 
-        if self._size_x != 0:
-            assert self._size_x == size_x
-        
-        if self._size_y != 0:
-            assert self._size_y == size_y
+        # Load the spritesheet
+        image = self.__read_sheet_image(img_file, 'base', decode)
+        assert image is not None
 
-        self._size_x = size_x
-        self._size_y = size_y
+        self._size_x = image.get_x_size()
+        self._size_y = image.get_y_size()
 
         self._img_file = img_file
         assert not self._img_file.empty()
 
-        self._frames = []
-        for row_idx in range(self._rows):
-            for col_idx in range(self._cols):
-                self._frames.append(SpriteCell(col_idx, row_idx))
+        self._frames = get_cell_table(self._rows, self._cols)
+
+        # Paged sheets are laid out as if the sheet was a single page tall,
+        # since every page texture shares the same padded size
+        sheet_rows = self._rows
+        sheet_size_y = self._size_y
+        if self._page_rows:
+            sheet_rows = min(self._page_rows, self._rows)
+            sheet_size_y = (self._size_y // self._rows) * sheet_rows
 
         # We need to find the power of two size for the another PNMImage
         # so that the texture thats loaded on the geometry won't have artifacts
         texture_size_x = self._next_size(self._size_x)
-        texture_size_y = self._next_size(self._size_y)
+        texture_size_y = self._next_size(sheet_size_y)
 
         # The actual size of the texture in memory
         self._real_size_x = texture_size_x
         self._real_size_y = texture_size_y
 
-        self._padded_img = core.PNMImage(texture_size_x, texture_size_y)
-        if image.has_alpha:
-            self._padded_img.alpha_fill(0)
-        self._padded_img.blend_sub_image(image, 0, 0)
-        image.clear()
+        if decode:
+            self._padded_img = self.__pad_image(image)
+        else:
+            self._padded_img = None
 
-        # The pixel sizes for each cell
-        self._col_size = self._size_x/self._cols
-        self._row_size = self._size_y/self._rows
+        # The pixel sizes for each cell. Sheets with metadata size the
+        # card to their largest untrimmed frame instead
+        if self._sheet_data is not None:
+            self._col_size = self._sheet_data.source_x
+            self._row_size = self._sheet_data.source_y
+        else:
+            self._col_size = self._size_x/self._cols
+            self._row_size = self._size_y/self._rows
 
         # How much padding the texture has
         self._padding_x = texture_size_x - self._size_x
-        self._padding_y = texture_size_y - self._size_y
+        self._padding_y = texture_size_y - sheet_size_y
 
         # Set UV padding
         self._u_pad = float(self._padding_x/texture_size_x)
@@ -454,15 +793,327 @@ class Sprite2D(object):
 
         # The UV dimensions for each cell
         self._u_size = (1.0 - self._u_pad) / self._cols
-        self._v_size = (1.0 - self._v_pad) / self._rows
+        self._v_size = (1.0 - self._v_pad) / sheet_rows
+
+        if self._sheet_data is not None:
+            self.__build_frame_table()
+
+    def __get_page_key(self, page):
+        """
+        Returns the shared page cache key for a page of the base sheet
+        """
+
+        return (self._img_file.get_fullpath(), self._rows, self._page_rows, page,
+            self._repeat_x > 1, self._repeat_y > 1)
+
+    def __load_pages(self, pages):
+        """
+        Makes the given pages of the base sheet resident, decoding the sheet
+        once for every page that is missing from the page cache. Returns
+        the page textures keyed by page, or None if the sheet could not
+        be read
+        """
+
+        textures = {}
+        missing = []
+        for page in pages:
+            texture = page_cache.get(self.__get_page_key(page))
+            if texture is None:
+                missing.append(page)
+            else:
+                textures[page] = texture
+
+        if missing:
+            image = self.__read_sheet_image(self._img_file, 'page')
+            if image is None:
+                return None
+
+            # Row pixel sizes are whole numbers for sheets that divide evenly
+            page_size_y = (self._size_y // self._rows) * self._page_rows
+            for page in missing:
+                if sprite_notify.getDebug():
+                    sprite_notify.debug('Loading spritesheet page %d: %s' % (page, self._img_file))
+
+                page_y = page * page_size_y
+                page_img = core.PNMImage(
+                    self._real_size_x, self._real_size_y,
+                    image.get_num_channels(), image.get_maxval())
+                if image.has_alpha():
+                    page_img.alpha_fill(0)
+                page_img.copy_sub_image(image, 0, 0, 0, page_y,
+                    self._size_x, min(page_size_y, self._size_y - page_y))
+
+                texture = core.Texture('%s:%d' % (self._img_file.get_basename(), page))
+                texture.load(page_img)
+                self.__apply_texture_settings(texture)
+
+                page_cache.store(self.__get_page_key(page), texture)
+                textures[page] = texture
+
+            image.clear()
+
+        return textures
+
+    def __get_animation_pages(self, frames):
+        """
+        Returns the sorted pages referenced by the given frames
+        """
+
+        pages = set()
+        for frame in frames:
+            pages.add(self.__get_frame_page(frame))
+
+        return array('I', sorted(pages))
+
+    def __show_page(self, page):
+        """
+        Applies the texture of the given page to the sprite. Pages pinned
+        by the playing animation are used without touching the page cache
+        """
+
+        texture = self._pinned_pages.get(page)
+        if texture is None:
+            textures = self.__load_pages([page])
+            if textures is None:
+                return
+
+            texture = textures[page]
+
+        self._texture = texture
+        self._node.set_texture(self._texture)
+        self._current_page = page
+
+    def __get_frame_page(self, frame):
+        """
+        Returns the page holding the given frame
+        """
+
+        return self._frames.rows[frame] // self._page_rows
+
+    def __cancel_deferred_page(self):
+        """
+        Stops the pending load of the first page, if any
+        """
+
+        if self._page_task:
+            taskMgr.remove(self._page_task)
+            self._page_task = None
+
+    def __pin_animation_pages(self):
+        """
+        Makes every page of the current animation resident and pins them
+        for the length of playback. A first page that is still pending is
+        decoded in the same batch
+        """
+
+        self.__unpin_pages()
+
+        pages = list(self._current_anim.pages)
+        if self._page_task:
+            self.__cancel_deferred_page()
+            page = self.__get_frame_page(self._current_frame)
+            if page not in pages:
+                pages.append(page)
+
+        textures = self.__load_pages(pages)
+        if textures is not None:
+            self._pinned_pages = textures
+
+        self.flip_texture()
+
+    def __is_animation_playing(self):
+        """
+        Returns true if an animation is currently being played back
+        """
+
+        return self._play_task is not None and self._play_task.is_alive() \
+            and not self._frame_interrupt
+
+    def __unpin_pages(self):
+        """
+        Releases the pages pinned by the last played animation
+        """
+
+        self._pinned_pages = {}
+
+    async def __deferred_page_task(self, task):
+        """
+        Task used to show the page of the current frame when no frame or
+        animation was requested in the frame the sprite was created
+        """
+
+        self._page_task = None
+        self.flip_texture()
+        return task.done
+
+    def __build_frame_table(self):
+        """
+        Looks up the shared texture transform and card placement of every
+        frame in the sheet metadata against the padded texture size
+        """
+
+        data = self._sheet_data
+        if data.size_x > self._size_x or data.size_y > self._size_y:
+            sprite_notify.warning('Sprite metadata frames exceed the spritesheet: %s; expected %dx%d got %dx%d' % (
+                self._img_file, self._size_x, self._size_y, data.size_x, data.size_y))
+
+        self._frame_table = get_frame_table(
+            data, self._real_size_x, self._real_size_y, self._col_size, self._row_size)
+
+    def __pad_image(self, image):
+        """
+        Copies the image into the top left of a power of two sized
+        image matching the sprite texture size
+        """
+
+        padded_img = core.PNMImage(self._real_size_x, self._real_size_y)
+        if image.has_alpha:
+            padded_img.alpha_fill(0)
+        padded_img.blend_sub_image(image, 0, 0)
+        image.clear()
+
+        return padded_img
+
+    def __get_sheet_texture_key(self, img_file):
+        """
+        Returns the shared texture cache key for the given sheet file
+        """
+
+        return (img_file.get_fullpath(), self._repeat_x > 1, self._repeat_y > 1)
+
+    def __acquire_sheet_texture(self, role, img_file, sheet_type, padded_img=None):
+        """
+        Returns the shared padded texture for the given sheet file, decoding
+        and uploading it only if no other sprite has loaded it yet. The
+        sprite holds a reference to it under the given role, releasing the
+        texture it previously held for that role
+        """
+
+        key = self.__get_sheet_texture_key(img_file)
+        entry = _sheet_textures.get(key)
+        if entry is not None:
+            texture, size_x, size_y, refs = entry
+            if size_x != self._size_x or size_y != self._size_y:
+                sprite_notify.warning('Spritesheet %s size mismatch: %s; expected %dx%d got %dx%d' % (
+                    sheet_type, img_file, self._size_x, self._size_y, size_x, size_y))
+                return None
+        else:
+            if padded_img is None:
+                image = self.__read_sheet_image(img_file, sheet_type)
+                if image is None:
+                    return None
+
+                padded_img = self.__pad_image(image)
+
+            texture = core.Texture(img_file.get_basename())
+            texture.load(padded_img)
+            self.__apply_texture_settings(texture)
+
+            entry = [texture, self._size_x, self._size_y, 0]
+            _sheet_textures[key] = entry
+
+        entry[3] += 1
+        self.__release_sheet_texture(role)
+        self._sheet_texture_refs[role] = key
+
+        return texture
+
+    def __release_sheet_texture(self, role):
+        """
+        Releases the shared sheet texture held under the given role. The
+        texture leaves the cache once no sprite references it
+        """
+
+        key = self._sheet_texture_refs.pop(role, None)
+        entry = _sheet_textures.get(key)
+        if entry is None:
+            return
+
+        entry[3] -= 1
+        if entry[3] <= 0:
+            del _sheet_textures[key]
+
+    def __get_max_texture_stages(self):
+        """
+        Returns the number of texture stages supported by the window
+        """
+
+        try:
+            gsg = base.win.get_gsg()
+        except (NameError, AttributeError):
+            gsg = None
+
+        if gsg is None:
+            return self.MAX_TEXTURE_STAGES
+
+        return gsg.get_max_texture_stages()
+
+    def __fallback_to_composite(self):
+        """
+        Switches a stacked sprite to CPU compositing, copying the shared
+        sheet textures back into images
+        """
+
+        # The base may not have been applied yet when the fallback happens
+        # while the constructor adds layers
+        if self._padded_img is None:
+            entry = _sheet_textures.get(self.__get_sheet_texture_key(self._img_file))
+            if entry is not None:
+                self._padded_img = core.PNMImage()
+                entry[0].store(self._padded_img)
+            else:
+                image = self.__read_sheet_image(self._img_file, 'base')
+                assert image is not None
+                self._padded_img = self.__pad_image(image)
+
+        self.__release_sheet_texture('base')
+
+        for layer_name in self._layers:
+            layer_image = core.PNMImage()
+            self._layers[layer_name].store(layer_image)
+            self._layers[layer_name] = layer_image
+            self.__release_sheet_texture(('layer', layer_name))
+
+        for stage in self._texture_stages[1:]:
+            self._node.clear_texture(stage)
+
+        self._texture_stages = self._texture_stages[:1]
+        self._layer_mode = self.LAYERS_COMPOSITE
+        self._node.set_shader_input('sprite_layer_count', core.LVecBase4i(0, 0, 0, 0))
+
+    def __update_layer_stages(self):
+        """
+        Applies each layer texture to its own texture stage on the node
+        """
+
+        for stage in self._texture_stages[1:]:
+            self._node.clear_texture(stage)
+
+        self._texture_stages = self._texture_stages[:1]
+        for layer_name in self._layers:
+            stage = get_layer_stage(len(self._texture_stages) - 1)
+            self._node.set_texture(stage, self._layers[layer_name])
+            self._texture_stages.append(stage)
+
+        # Tell the variant shaders how many stacked layers to blend
+        self._node.set_shader_input('sprite_layer_count',
+            core.LVecBase4i(len(self._texture_stages) - 1, 0, 0, 0))
 
     def __update_final_image(self):
         """
         Constructs the final PNM image based on the base and all layers provided
         """
 
-        # Set base image object
-        self._final_img = self._padded_img
+        # Stacked layers are blended at draw time
+        if self._layer_mode == self.LAYERS_STACKED:
+            return
+
+        # Set base image object. Layers are blended into a copy so the
+        # base stays intact when layers are removed later
+        if self._layers:
+            self._final_img = core.PNMImage(self._padded_img)
+        else:
+            self._final_img = self._padded_img
 
         # Blend layers
         for layer_name in self._layers:
@@ -516,37 +1167,75 @@ class Sprite2D(object):
         self._offset_x = (float(self._col_size)/self._real_size_x)
         self._offset_y = (float(self._row_size)/self._real_size_y)
 
-        self._node.set_tex_scale(
-            core.TextureStage.get_default(), 
-            self._offset_x * self._repeat_x, 
-            self._offset_y * self._repeat_y)
-        self._node.set_tex_offset(
-            core.TextureStage.get_default(), 0, 1 - self._offset_y)
-
-        # Create the sprite texture
-        self._texture = core.Texture()
-        self._texture.set_x_size(self._real_size_x)
-        self._texture.set_y_size(self._real_size_y)
-        self._texture.set_z_size(1)
-        
-        # Load the final layered and padded PNMImage into the texture
-        self._texture.load(self._final_img)
-        self._texture.set_magfilter(core.Texture.FTNearest)
-        self._texture.set_minfilter(core.Texture.FTNearest)
+        if self._page_rows:
+            # Page textures are applied as their frames are shown. The first
+            # page waits for the first frame or animation requested, or the
+            # next frame, so creating a sprite never decodes the sheet
+            self._current_page = None
+            try:
+                self._page_task = taskMgr.do_method_later(
+                    0,
+                    self.__deferred_page_task,
+                    "%s-sprite-page" % self.__class__.__name__)
+            except NameError:
+                self._page_task = None
+
+            self.flip_texture()
+            return
+
+        if self._layer_mode == self.LAYERS_STACKED:
+            # Use the shared base texture and stack each layer on top
+            key = self.__get_sheet_texture_key(self._img_file)
+            if self._sheet_texture_refs.get('base') != key:
+                self._texture = self.__acquire_sheet_texture('base', self._img_file, 'base', self._padded_img)
+                assert self._texture is not None
+            self._padded_img = None
+
+            self.__update_layer_stages()
+        else:
+            # Create the sprite texture
+            self._texture = core.Texture()
+            self._texture.set_x_size(self._real_size_x)
+            self._texture.set_y_size(self._real_size_y)
+            self._texture.set_z_size(1)
+
+            # Load the final layered and padded PNMImage into the texture
+            self._texture.load(self._final_img)
+            self.__apply_texture_settings(self._texture)
+
+        assert self._node != None
+        self._node.set_texture(self._texture)
+
+        # Apply the texture transform of the current frame to every stage
+        self.flip_texture()
+
+    def __apply_texture_settings(self, texture):
+        """
+        Applies the sprite filtering and wrap modes to the texture
+        """
+
+        texture.set_magfilter(core.Texture.FTNearest)
+        texture.set_minfilter(core.Texture.FTNearest)
 
         #Set up texture clamps according to repeats
         if self._repeat_x > 1:
-            self._texture.set_wrap_u(core.Texture.WMRepeat)
+            texture.set_wrap_u(core.Texture.WMRepeat)
         else:
-            self._texture.set_wrap_u(core.Texture.WMClamp)
-        
+            texture.set_wrap_u(core.Texture.WMClamp)
+
         if self._repeat_y > 1:
-            self._texture.set_wrap_v(core.Texture.WMRepeat)
+            texture.set_wrap_v(core.Texture.WMRepeat)
         else:
-            self._texture.set_wrap_v(core.Texture.WMClamp)
-        
-        assert self._node != None
-        self._node.set_texture(self._texture)
+            texture.set_wrap_v(core.Texture.WMClamp)
+
+    def __set_tex_transform(self, s_u, s_v, o_u, o_v):
+        """
+        Applies the texture scale and offset to every active texture stage
+        """
+
+        for stage in self._texture_stages:
+            self._node.set_tex_scale(stage, s_u, s_v)
+            self._node.set_tex_offset(stage, o_u, o_v)
 
     def _next_size(self, num):
         """ 
@@ -560,11 +1249,19 @@ class Sprite2D(object):
 
     def set_frame(self, frame=0):
         """ 
-        Sets the current sprite to the given frame 
+        Sets the current sprite to the given frame. Frames can be given
+        by name when the sprite has sheet metadata
         """
 
+        cell = self.__normalize_frame(frame)
+        if cell is None:
+            sprite_notify.warning('Failed to set frame: %s; Out of range' % frame)
+            return
+
         self._frame_interrupt = True
-        self._current_frame = frame
+        self._current_frame = cell
+        self.__cancel_deferred_page()
+        self.__unpin_pages()
         self.flip_texture()
 
     def play_animation(self, anim_name, loop=False):
@@ -587,22 +1284,85 @@ class Sprite2D(object):
 
         self._current_anim = self._animations.get(anim_name)
         self._current_anim.playhead = 0
+
+        # Make every page of the animation resident before its first frame
+        self.__unpin_pages()
+        if self._current_anim.pages is not None:
+            self.__pin_animation_pages()
+
+        # Animations with per frame durations show their first frame
+        # immediately and reschedule using each frames duration
+        if self._current_anim.durations is not None:
+            delay = 0
+        else:
+            delay = 1.0/self._current_anim.fps
+
         self._play_task = taskMgr.do_method_later(
-            1.0/self._current_anim.fps,
+            delay,
             self.__animation_task, 
             "%s-sprite-animation" % self.__class__.__name__)
 
     def create_animation(self, anim_name, frames, fps=12):
         """ 
         Create a named animation. 
-        Takes the animation name and a tuple of frame numbers 
+        Takes the animation name and a tuple of frame numbers. When the sprite
+        has sheet metadata frames may be given by name, and an fps of None
+        plays each frame for its duration from the metadata. Paged sprites
+        record the pages the animation needs so playback can prefetch them
         """
 
-        animation = SpriteAnimation(frames, fps)
+        cells = []
+        for frame in frames:
+            cell = self.__normalize_frame(frame)
+            if cell is None:
+                sprite_notify.warning('Failed to create animation: %s; Frame %s out of range' % (anim_name, frame))
+                return None
+
+            cells.append(cell)
+        frames = cells
+
+        durations = None
+        if self._sheet_data is not None:
+            if fps is None:
+                durations = self._sheet_data.get_frame_durations(frames)
+
+        if fps is None and durations is None:
+            sprite_notify.warning('Failed to create animation: %s; Frame durations need sheet metadata' % anim_name)
+            return None
+
+        pages = None
+        if self._page_rows:
+            pages = self.__get_animation_pages(frames)
+
+        animation = SpriteAnimation(frames, fps, durations, pages)
         self._animations[anim_name] = animation
 
         return animation
 
+    def __normalize_frame(self, frame):
+        """
+        Returns the cell index for the given frame. Negative frames count
+        back from the last cell. Returns None if the frame is out of range
+        """
+
+        if self._sheet_data is not None:
+            try:
+                frame = self._sheet_data.get_frame_index(frame)
+            except KeyError:
+                return None
+            frame_count = self._sheet_data.frame_count
+        else:
+            frame_count = len(self._frames)
+
+        frame = int(frame)
+        if frame < 0:
+            frame += frame_count
+
+        if frame < 0 or frame >= frame_count:
+            return None
+
+        return frame
+
     def flip_x(self, val=None):
         """ 
         Flip the sprite on X. If no value given, it will invert the current flipping.
@@ -640,27 +1400,188 @@ class Sprite2D(object):
         Sets the texture coordinates of the texture to the current frame
         """
 
+        if self._frame_table is not None:
+            self.__flip_table_texture()
+            return
+
+        cell_col = self._frames.cols[self._current_frame]
+        cell_row = self._frames.rows[self._current_frame]
+
+        # Paged sheets address rows relative to the page holding the frame
+        if self._page_rows:
+            page = cell_row // self._page_rows
+            cell_row -= page * self._page_rows
+            if page != self._current_page and self._page_task is None:
+                self.__show_page(page)
+
         s_u = self._offset_x * self._repeat_x
         s_v = self._offset_y * self._repeat_y
-        o_u = 0 + self._frames[self._current_frame].col * self._u_size
-        o_v = 1 - self._frames[self._current_frame].row * self._v_size - self._offset_y
+        o_u = 0 + cell_col * self._u_size
+        o_v = 1 - cell_row * self._v_size - self._offset_y
         if self._flip['x']:
             s_u *= -1
-            o_u = self._u_size + self._frames[self._current_frame].col * self._u_size
+            o_u = self._u_size + cell_col * self._u_size
         if self._flip['y']:
             s_v *= -1
-            o_v = 1 - self._frames[self._current_frame].row * self._v_size
+            o_v = 1 - cell_row * self._v_size
 
-        self._node.set_tex_scale(core.TextureStage.get_default(), s_u, s_v)
-        self._node.set_tex_offset(core.TextureStage.get_default(), o_u, o_v)
+        self.__set_tex_transform(s_u, s_v, o_u, o_v)
     
+    def __flip_table_texture(self):
+        """
+        Sets the texture coordinates and card placement of the current
+        frame using the precomputed frame table
+        """
+
+        index = self._current_frame * self.FRAME_TABLE_STRIDE
+        o_u, o_v, s_u, s_v, card_x, card_z, card_sx, card_sz = \
+            self._frame_table[index:index + self.FRAME_TABLE_STRIDE]
+
+        if self._flip['x']:
+            o_u += s_u
+            s_u *= -1
+            card_x = 1.0 - card_x - card_sx
+        if self._flip['y']:
+            o_v += s_v
+            s_v *= -1
+            card_z = 1.0 - card_z - card_sz
+
+        width = self._pos_right - self._pos_left
+        height = self._pos_bottom - self._pos_top
+
+        self._card.set_pos(
+            self._pos_left * (1.0 - card_sx) + card_x * width, 0,
+            self._pos_top * (1.0 - card_sz) + card_z * height)
+        self._card.set_scale(card_sx, 1, card_sz)
+
+        self.__set_tex_transform(s_u, s_v, o_u, o_v)
+
+    def set_palette(self, palette):
+        """
+        Colors an indexed sprite sheet using the given SpritePalette. Indexed
+        sheets store the palette index of each pixel in their red channel.
+        Swapping palettes only changes a shader input
+        """
+
+        self._palette = palette
+        self.__update_variant_shader()
+
+    def clear_palette(self):
+        """
+        Stops coloring the sprite sheet through a palette
+        """
+
+        self._palette = None
+        self.__update_variant_shader()
+
+    def set_tint(self, color, mask_path=None):
+        """
+        Tints the sprite by the given color. An optional mask sheet with the
+        same layout as the base sheet limits the tint to its red channel.
+        Masks are stored once and shared between sprites. Tints apply on
+        top of any palette
+        """
+
+        if mask_path is None:
+            mask = None
+            self.__release_sheet_texture('mask')
+        elif self._page_rows:
+            sprite_notify.warning('Failed to apply tint mask: %s; Not supported by paged sheets' % mask_path)
+            return
+        else:
+            file_name = self.__resolve_vfs_relative_path(
+                file_path=mask_path,
+                file_type='tint mask')
+
+            mask = self.__acquire_sheet_texture('mask', file_name, 'mask')
+            if mask is None:
+                sprite_notify.warning('Failed to apply tint mask: %s' % mask_path)
+                return
+
+        if len(color) == 3:
+            color = (color[0], color[1], color[2], 1.0)
+
+        self._tint = core.LColor(*color)
+        self._tint_mask = mask
+        self.__update_variant_shader()
+
+    def clear_tint(self):
+        """
+        Stops tinting the sprite
+        """
+
+        self._tint = None
+        self._tint_mask = None
+        self.__release_sheet_texture('mask')
+        self.__update_variant_shader()
+
+    def __update_variant_shader(self):
+        """
+        Applies the palette and tint state to the variant shader. The shader
+        is applied while either is active, compositing layers on the CPU if
+        more are stacked than the shader can blend
+        """
+
+        if self._palette is None and self._tint is None:
+            if self._variant_shader is not None:
+                self._variant_shader = None
+                self._node.clear_shader()
+            return
+
+        if self._variant_shader is None:
+            if self._layer_mode == self.LAYERS_STACKED and len(self._layers) > SHADER_MAX_LAYERS:
+                sprite_notify.info('Too many layers to stack; falling back to compositing')
+                self.__fallback_to_composite()
+                self.__update_final_image()
+                self.__construct_sprite_texture()
+
+            self._variant_shader = get_variant_shader()
+            self._node.set_shader(self._variant_shader)
+
+        # Unused inputs get neutral values so each feature works alone
+        if self._palette is not None:
+            self._node.set_shader_input('sprite_palette', self._palette.texture)
+            self._node.set_shader_input('sprite_use_palette', core.LVecBase4i(1, 0, 0, 0))
+        else:
+            self._node.set_shader_input('sprite_palette', get_full_mask())
+            self._node.set_shader_input('sprite_use_palette', core.LVecBase4i(0, 0, 0, 0))
+
+        if self._tint is not None:
+            self._node.set_shader_input('sprite_tint', self._tint)
+        else:
+            self._node.set_shader_input('sprite_tint', core.LColor(1, 1, 1, 0))
+
+        if self._tint_mask is not None:
+            self._node.set_shader_input('sprite_mask', self._tint_mask)
+        else:
+            self._node.set_shader_input('sprite_mask', get_full_mask())
+        self._node.set_shader_input('sprite_layer_count',
+            core.LVecBase4i(len(self._texture_stages) - 1, 0, 0, 0))
+
     def clear(self):
         """ 
         Free up the texture memory being used 
         """
 
-        self._texture.clear()
-        self._padded_img.clear()
+        # Stacked sheet and page textures are shared with other sprites.
+        # Sprites that were already cleared no longer hold a texture
+        if self._layer_mode != self.LAYERS_STACKED and not self._page_rows:
+            if self._texture is not None:
+                self._texture.clear()
+            if self._padded_img is not None:
+                self._padded_img.clear()
+
+        for role in list(self._sheet_texture_refs):
+            self.__release_sheet_texture(role)
+
+        if self._play_task:
+            taskMgr.remove(self._play_task)
+            self._play_task = None
+
+        self.__cancel_deferred_page()
+        self.__unpin_pages()
+        self._layers = {}
+        self._texture = None
         self._node.remove_node()
     
     async def __animation_task(self, task):
@@ -674,6 +1595,9 @@ class Sprite2D(object):
         self._current_frame = self._current_anim.cells[self._current_anim.playhead]
         self.flip_texture()
 
+        if self._current_anim.durations is not None:
+            task.delay_time = self._current_anim.durations[self._current_anim.playhead]
+
         if self._current_anim.playhead + 1 < len(self._current_anim.cells):
             self._current_anim.playhead += 1
             return task.again
@@ -682,4 +1606,5 @@ class Sprite2D(object):
             self._current_anim.playhead = 0
             return task.again
 
+        self.__unpin_pages()
         return task.done
\ No newline at end of file
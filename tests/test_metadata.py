@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from panda3d_sprite import metadata
+from panda3d_sprite.metadata import SpriteSheetData, load_sheet_data
+
+
+def make_frame(x, y, w=16, h=16, duration=None, trim=None, source=None):
+    frame = {'frame': {'x': x, 'y': y, 'w': w, 'h': h}}
+    if duration is not None:
+        frame['duration'] = duration
+    if trim is not None:
+        frame['spriteSourceSize'] = dict(zip('xywh', trim))
+    if source is not None:
+        frame['sourceSize'] = dict(zip('wh', source))
+    return frame
+
+
+def test_hash_format():
+    data = SpriteSheetData({
+        'frames': {
+            'idle 0': make_frame(0, 0, duration=100),
+            'idle 1': make_frame(16, 0, duration=250),
+        },
+        'meta': {'size': {'w': 32, 'h': 16}},
+    })
+
+    assert data.frame_names == ['idle 0', 'idle 1']
+    assert data.get_frame_index('idle 1') == 1
+    assert data.get_frame_index(0) == 0
+    assert list(data.rects) == [0, 0, 16, 16, 16, 0, 16, 16]
+    assert list(data.durations) == pytest.approx([0.1, 0.25])
+
+
+def test_array_format():
+    frames = [make_frame(0, 0), make_frame(0, 16)]
+    frames[0]['filename'] = 'walk_0'
+    data = SpriteSheetData({'frames': frames, 'meta': {'size': {'w': 16, 'h': 32}}})
+
+    # Unnamed entries fall back to their index
+    assert data.frame_names == ['walk_0', '1']
+    assert list(data.durations) == pytest.approx([SpriteSheetData.DEFAULT_DURATION] * 2)
+
+
+def test_rects_and_trims():
+    data = SpriteSheetData({
+        'frames': {'a': make_frame(16, 32, 8, 16, trim=(4, 0, 8, 16), source=(16, 16))},
+        'meta': {'size': {'w': 64, 'h': 64}},
+    })
+
+    assert list(data.rects) == [16, 32, 8, 16]
+    assert list(data.trims) == [4, 0, 8, 16]
+    assert (data.source_x, data.source_y) == (16, 16)
+
+
+def test_size_falls_back_to_frame_extents():
+    data = SpriteSheetData({'frames': {'a': make_frame(0, 0), 'b': make_frame(16, 8)}})
+
+    assert (data.size_x, data.size_y) == (32, 24)
+
+
+def test_tag_directions():
+    data = SpriteSheetData({
+        'frames': [make_frame(index * 16, 0) for index in range(4)],
+        'meta': {'frameTags': [
+            {'name': 'forward', 'from': 0, 'to': 3},
+            {'name': 'reverse', 'from': 0, 'to': 3, 'direction': 'reverse'},
+            {'name': 'pingpong', 'from': 0, 'to': 3, 'direction': 'pingpong'},
+            {'name': 'pingpong_reverse', 'from': 0, 'to': 3, 'direction': 'pingpong_reverse'},
+        ]},
+    })
+
+    assert list(data.tags['forward']) == [0, 1, 2, 3]
+    assert list(data.tags['reverse']) == [3, 2, 1, 0]
+    assert list(data.tags['pingpong']) == [0, 1, 2, 3, 2, 1]
+    assert list(data.tags['pingpong_reverse']) == [3, 2, 1, 0, 1, 2]
+
+
+def test_texturepacker_animations():
+    data = SpriteSheetData({
+        'frames': {'a': make_frame(0, 0), 'b': make_frame(16, 0)},
+        'animations': {'blink': ['b', 'a'], 'broken': ['missing']},
+    })
+
+    assert list(data.tags['blink']) == [1, 0]
+    assert 'broken' not in data.tags
+
+
+def test_load_sheet_data_caches(tmp_path):
+    path = tmp_path / 'sheet.json'
+    path.write_text(json.dumps({
+        'frames': {'a': make_frame(0, 0)},
+        'meta': {'image': 'sheet.png', 'size': {'w': 16, 'h': 16}},
+    }))
+
+    metadata.clear_sheet_data_cache()
+    file_path = path.as_posix()
+    data = load_sheet_data(file_path)
+
+    assert data is not None
+    assert data.image.get_basename() == 'sheet.png'
+    assert load_sheet_data(file_path) is data
+
+
+def test_load_sheet_data_missing(tmp_path):
+    assert load_sheet_data((tmp_path / 'missing.json').as_posix()) is None
@@ -0,0 +1,155 @@
+import builtins
+import os
+import time
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from panda3d import core
+
+from direct.task.TaskManagerGlobal import taskMgr
+
+from panda3d_sprite.paging import SpritePageCache, page_cache
+from panda3d_sprite.sprite import Sprite2D
+
+
+SHEET_PATH = core.Filename.from_os_specific(os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'examples', 'SaraFullSheet.png')))
+
+
+def make_texture(size):
+    texture = core.Texture()
+    texture.setup_2d_texture(size, size, core.Texture.T_unsigned_byte, core.Texture.F_rgba)
+    return texture
+
+
+def test_store_tracks_size():
+    cache = SpritePageCache(max_size=1024 * 1024)
+    cache.store('a', make_texture(16))
+    cache.store('b', make_texture(8))
+
+    assert len(cache) == 2
+    assert cache.size == 16 * 16 * 4 + 8 * 8 * 4
+
+    cache.store('a', make_texture(8))
+    assert cache.size == 2 * 8 * 8 * 4
+
+
+def test_least_recently_used_is_evicted():
+    page_size = 16 * 16 * 4
+    cache = SpritePageCache(max_size=page_size * 2)
+    cache.store('a', make_texture(16))
+    cache.store('b', make_texture(16))
+
+    assert cache.get('a') is not None
+    cache.store('c', make_texture(16))
+
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert cache.size == page_size * 2
+
+
+def test_most_recent_page_is_kept_over_budget():
+    cache = SpritePageCache(max_size=1)
+    cache.store('a', make_texture(16))
+    cache.store('b', make_texture(16))
+
+    assert 'a' not in cache and 'b' in cache
+    assert cache.get('a') is None
+
+
+def test_shrinking_budget_evicts():
+    cache = SpritePageCache(max_size=1024 * 1024)
+    for key in 'abcd':
+        cache.store(key, make_texture(16))
+
+    cache.max_size = 16 * 16 * 4
+    assert len(cache) == 1 and 'd' in cache
+
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+@pytest.fixture
+def paged(monkeypatch):
+    monkeypatch.setattr(builtins, 'taskMgr', taskMgr, raising=False)
+    page_cache.clear()
+
+    # Count every decode of the sheet pixels
+    reads = []
+    read_sheet_image = Sprite2D._Sprite2D__read_sheet_image
+    def count_reads(self, img_file, sheet_type, decode=True):
+        if decode:
+            reads.append(sheet_type)
+        return read_sheet_image(self, img_file, sheet_type, decode)
+    monkeypatch.setattr(Sprite2D, '_Sprite2D__read_sheet_image', count_reads)
+
+    sheet = Sprite2D(SHEET_PATH, rows=21, cols=13, page_rows=4)
+    yield sheet, reads
+
+    sheet.clear()
+    page_cache.max_size = None
+    page_cache.clear()
+
+
+def test_construction_decodes_nothing(paged):
+    sheet, reads = paged
+
+    assert reads == []
+    assert sheet.current_page is None
+    assert len(page_cache) == 0
+
+
+def test_first_page_is_batched_with_animation(paged):
+    sheet, reads = paged
+    sheet.create_animation('walk', (13 * 4, 13 * 8), 12)
+    sheet.play_animation('walk')
+
+    assert reads == ['page']
+    assert sheet.current_page == 0
+    assert len(page_cache) == 3
+
+
+def test_prefetched_pages_stay_pinned(paged):
+    sheet, reads = paged
+    page_cache.max_size = 1
+
+    sheet.create_animation('walk', (13 * 4, 13 * 8, 13 * 12), 1000)
+    sheet.play_animation('walk')
+    assert len(page_cache) == 1
+
+    clock = core.ClockObject.get_global_clock()
+    for _ in range(20):
+        time.sleep(0.002)
+        clock.tick()
+        taskMgr.step()
+
+    assert sheet.current_page == 3
+    assert reads == ['page']
+
+
+def test_swap_during_playback_repins_pages(paged, tmp_path):
+    sheet, reads = paged
+    swapped_path = tmp_path / 'swapped.png'
+    swapped_path.write_bytes(open(SHEET_PATH.to_os_specific(), 'rb').read())
+
+    sheet.create_animation('walk', (13 * 4, 13 * 8, 13 * 12), 1000)
+    sheet.play_animation('walk', loop=True)
+
+    clock = core.ClockObject.get_global_clock()
+    for _ in range(3):
+        time.sleep(0.002)
+        clock.tick()
+        taskMgr.step()
+
+    sheet.swap_base_spritesheet(core.Filename.from_os_specific(str(swapped_path)))
+    assert reads == ['page', 'page']
+
+    for _ in range(3):
+        time.sleep(0.002)
+        clock.tick()
+        taskMgr.step()
+
+        assert sheet.img_file.get_basename() == 'swapped.png'
+        assert sheet.texture.get_name().startswith('swapped.png:')
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from panda3d import core
+
+from panda3d_sprite.sorting import SpriteSortBin
+
+
+class FakeSprite(object):
+
+    def __init__(self, parent, z):
+        self.node = parent.attach_new_node('sprite')
+        self.node.set_z(z)
+
+
+def assert_sorted(sort_bin):
+    keys = [sprite.node.get_z(sort_bin.reference) for sprite in sort_bin.sprites]
+    assert keys == sorted(keys, reverse=True)
+
+    for index, sprite in enumerate(sort_bin.sprites):
+        assert sprite.node.get_bin_name() == sort_bin.bin_name
+        assert sprite.node.get_bin_draw_order() == index
+
+
+@pytest.fixture
+def root():
+    return core.NodePath('root')
+
+
+def test_add_sorts_by_axis(root):
+    sort_bin = SpriteSortBin('test-add', reference=root)
+    sprites = [FakeSprite(root, z) for z in (1, 5, 3)]
+    for sprite in sprites:
+        sort_bin.add_sprite(sprite)
+
+    assert sort_bin.sprites == [sprites[1], sprites[2], sprites[0]]
+    assert_sorted(sort_bin)
+
+
+def test_update_resorts_moved_sprites(root):
+    random.seed(1)
+    sort_bin = SpriteSortBin('test-update', reference=root)
+    sprites = [FakeSprite(root, random.random()) for _ in range(100)]
+    for sprite in sprites:
+        sort_bin.add_sprite(sprite)
+
+    for _ in range(20):
+        for sprite in random.sample(sprites, 5):
+            sprite.node.set_z(random.random())
+
+        sort_bin.update()
+        assert_sorted(sort_bin)
+
+
+def test_reference_handles_different_parents(root):
+    sort_bin = SpriteSortBin('test-parents', reference=root)
+    raised = root.attach_new_node('raised')
+    raised.set_z(10)
+
+    low = FakeSprite(raised, 0)
+    high = FakeSprite(root, 5)
+    sort_bin.add_sprite(high)
+    sort_bin.add_sprite(low)
+
+    assert sort_bin.sprites == [low, high]
+
+
+def test_remove_sprite_restores_bin(root):
+    sort_bin = SpriteSortBin('test-remove', reference=root)
+    sprites = [FakeSprite(root, z) for z in (3, 2, 1)]
+    for sprite in sprites:
+        sort_bin.add_sprite(sprite)
+
+    sort_bin.remove_sprite(sprites[0])
+
+    assert not sprites[0].node.has_bin()
+    assert_sorted(sort_bin)
+
+
+def test_removed_nodes_are_dropped(root):
+    sort_bin = SpriteSortBin('test-removed', reference=root)
+    sprites = [FakeSprite(root, z) for z in (3, 2, 1)]
+    for sprite in sprites:
+        sort_bin.add_sprite(sprite)
+
+    sprites[0].node.remove_node()
+    sort_bin.update()
+
+    assert sort_bin.sprites == sprites[1:]
+    assert_sorted(sort_bin)
+
+    sprites[1].node.remove_node()
+    sort_bin.remove_sprite(sprites[1])
+    assert sort_bin.sprites == sprites[2:]
@@ -0,0 +1,194 @@
+import os
+
+import pytest
+
+pytest.importorskip('panda3d')
+
+from panda3d import core
+
+from panda3d_sprite import sprite
+from panda3d_sprite.metadata import SpriteSheetData
+from panda3d_sprite.palette import SpritePalette
+from panda3d_sprite.sprite import Sprite2D, SpriteAnimation, clear_resolved_path_cache, get_cell_table
+
+
+def test_cell_table_layout():
+    table = get_cell_table(2, 3)
+
+    assert len(table) == 6
+    assert [(cell.col, cell.row) for cell in table] == [
+        (0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1)]
+    assert (table[-1].col, table[-1].row) == (2, 1)
+    assert [cell.col for cell in table[1:3]] == [1, 2]
+
+
+def test_cell_table_is_shared():
+    assert get_cell_table(4, 4) is get_cell_table(4, 4)
+    assert get_cell_table(4, 4) is not get_cell_table(4, 2)
+
+
+def test_animation_cells_are_compiled():
+    animation = SpriteAnimation((3, 1, 2), 12)
+
+    assert list(animation.cells) == [3, 1, 2]
+    assert animation.cells.typecode == 'I'
+    assert animation.playhead == 0
+
+
+SHEET_PATH = core.Filename.from_os_specific(os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'examples', 'SaraFullSheet.png')))
+
+
+def make_sprite(**kwargs):
+    return Sprite2D(SHEET_PATH, rows=21, cols=13, **kwargs)
+
+
+def test_stacked_textures_are_shared_and_released():
+    sprite.clear_sheet_texture_cache()
+
+    first = make_sprite(layer_mode=Sprite2D.LAYERS_STACKED, layers={'clothes': SHEET_PATH})
+    second = make_sprite(layer_mode=Sprite2D.LAYERS_STACKED)
+
+    assert first.texture is second.texture
+    assert [entry[3] for entry in sprite._sheet_textures.values()] == [3]
+
+    first.remove_layer('clothes')
+    assert [entry[3] for entry in sprite._sheet_textures.values()] == [2]
+
+    first.clear()
+    second.clear()
+    assert not sprite._sheet_textures
+
+
+def test_palette_and_tint_compose():
+    sheet = make_sprite()
+    palette = SpritePalette([(0, 1, 0)])
+
+    sheet.set_palette(palette)
+    sheet.set_tint((1, 0, 0))
+    assert sheet.palette is palette
+    assert sheet.node.get_shader() is not None
+
+    sheet.clear_tint()
+    assert sheet.palette is palette
+    assert sheet.node.get_shader() is not None
+
+    sheet.clear_palette()
+    assert sheet.node.get_shader() is None
+    sheet.clear()
+
+
+def test_clear_twice():
+    sheet = make_sprite()
+    sheet.clear()
+    sheet.clear()
+
+    assert sheet.texture is None
+    assert sheet.node.is_empty()
+
+
+def make_sheet_data():
+    frames = {}
+    for index in range(6):
+        frames['walk %d' % index] = {
+            'frame': {'x': index * 64, 'y': 64, 'w': 64, 'h': 64}, 'duration': 100}
+
+    return SpriteSheetData({'frames': frames, 'meta': {'size': {'w': 832, 'h': 1344}}})
+
+
+def test_frame_tables_are_shared():
+    data = make_sheet_data()
+    first = Sprite2D(SHEET_PATH, sheet_data=data)
+    second = Sprite2D(SHEET_PATH, sheet_data=data)
+
+    assert first.frame_table is second.frame_table
+    assert len(first.frame_table) == 6 * Sprite2D.FRAME_TABLE_STRIDE
+    assert len(first.frames) == 1
+
+    first.clear()
+    second.clear()
+
+
+def test_frame_durations_need_metadata():
+    sheet = make_sprite()
+    assert sheet.create_animation('walk', (0, 1), fps=None) is None
+    assert 'walk' not in sheet.animations
+
+    data_sheet = Sprite2D(SHEET_PATH, sheet_data=make_sheet_data())
+    animation = data_sheet.create_animation('walk', ('walk 0', 'walk 1'), fps=None)
+    assert list(animation.durations) == pytest.approx([0.1, 0.1])
+
+    sheet.clear()
+    data_sheet.clear()
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    # Count every image decode made while the fixture is active
+    decoded = []
+
+    class CountingImage(core.PNMImage):
+        def read(self, *args):
+            decoded.append(args[-1])
+            return super().read(*args)
+
+    monkeypatch.setattr(core, 'PNMImage', CountingImage)
+    return decoded
+
+
+def test_wrong_size_layer_is_rejected_from_header(tmp_path, decodes):
+    layer_path = core.Filename.from_os_specific(str(tmp_path / 'small.png'))
+    assert core.PNMImage(16, 16, 4).write(layer_path)
+
+    sheet = make_sprite()
+    assert decodes
+    del decodes[:]
+
+    sheet.add_layer('small', layer_path)
+    assert decodes == []
+    assert 'small' not in sheet._layers
+
+    sheet.clear()
+
+
+def test_resolved_paths_are_cached():
+    clear_resolved_path_cache()
+    sheet = make_sprite()
+
+    keys = [key for key in sprite._resolved_paths if key[0] == str(SHEET_PATH)]
+    assert len(keys) == 1
+
+    # Later lookups of the same path come from the cache
+    search_path = keys[0][1]
+    sprite._resolved_paths[('alias.png', search_path)] = sprite._resolved_paths[keys[0]]
+    alias = Sprite2D('alias.png', rows=21, cols=13)
+    assert alias.img_file == SHEET_PATH
+
+    clear_resolved_path_cache()
+    assert not sprite._resolved_paths
+
+    sheet.clear()
+    alias.clear()
+
+
+@pytest.mark.parametrize('compression', [0, 6])
+def test_sheet_loads_from_multifile(tmp_path, compression):
+    multifile_path = core.Filename.from_os_specific(str(tmp_path / 'sheets.mf'))
+    source = core.Filename(SHEET_PATH)
+    source.set_binary()
+
+    multifile = core.Multifile()
+    assert multifile.open_write(multifile_path)
+    multifile.add_subfile('sara.png', source, compression)
+    multifile.close()
+
+    vfs = core.VirtualFileSystem.get_global_ptr()
+    mount_point = '/sprite-test-%d' % compression
+    assert vfs.mount(multifile_path, mount_point, 0)
+    try:
+        sheet = Sprite2D(mount_point + '/sara.png', rows=21, cols=13)
+        assert (sheet.size_x, sheet.size_y) == (832, 1344)
+        assert sheet.texture.has_ram_image()
+        sheet.clear()
+    finally:
+        vfs.unmount(multifile_path)